@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк разбора ответа Prometheus: время и пиковая память на синтетических сериях
+
+Запуск: python benchmarks/prometheus_parse.py [--series 10000] [--repeat 5]
+"""
+
+import argparse
+import io
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from prometheus_client import (
+    optional_import,
+    parse_series_document,
+    parse_series_stream,
+    resolve_parser,
+)
+
+
+def build_response(series: int) -> bytes:
+    """
+    Сгенерировать тело ответа instant query с лишними метками, как у широкого селектора
+
+    Args:
+        series: Количество серий
+
+    Returns:
+        JSON в байтах
+    """
+    result = [
+        {
+            'metric': {
+                '__name__': 'tuya_plant_humidity',
+                'device_id': f"bf{i:020x}",
+                'device_name': f"Растение {i}",
+                'instance': 'home',
+                'job': 'tuya',
+                'zone': f"greenhouse-{i % 8}",
+            },
+            'value': [1760000000.123, str(20 + i % 70)],
+        }
+        for i in range(series)
+    ]
+    return json.dumps({'status': 'success', 'data': {'resultType': 'vector', 'result': result}}).encode()
+
+
+def parse_legacy(body: bytes) -> list:
+    """Прежний путь: response.json() и список словарей с копиями меток"""
+    data = json.loads(body)
+    plants = []
+    for item in data.get('data', {}).get('result', []):
+        labels = item.get('metric', {})
+        value = item.get('value', [None, None])
+        plants.append({
+            'device_id': labels.get('device_id', 'unknown'),
+            'device_name': labels.get('device_name', 'Unknown'),
+            'humidity': int(float(value[1])) if value[1] else 0,
+            'instance': labels.get('instance', ''),
+            'job': labels.get('job', ''),
+        })
+    return plants
+
+
+def measure(name: str, parse, repeat: int):
+    """
+    Замерить среднее время и пиковую память парсера
+
+    Args:
+        name: Название для отчета
+        parse: Функция без аргументов, выполняющая разбор
+        repeat: Количество повторов для усреднения времени
+    """
+    parse()  # Прогрев
+    start = time.perf_counter()
+    for _ in range(repeat):
+        count = len(parse())
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    parse()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"  {name:10} {elapsed * 1000:8.1f} мс  пик {peak / 1024 / 1024:6.1f} MiB  серий: {count}")
+
+
+def main():
+    """Главная функция"""
+    arg_parser = argparse.ArgumentParser(description="Бенчмарк разбора ответа Prometheus")
+    arg_parser.add_argument('--series', type=int, default=10000, help="Количество серий")
+    arg_parser.add_argument('--repeat', type=int, default=5, help="Количество повторов")
+    args = arg_parser.parse_args()
+
+    body = build_response(args.series)
+    print(f"Ответ: {args.series} серий, {len(body) / 1024 / 1024:.1f} MiB, auto -> {resolve_parser('auto')}")
+
+    measure('legacy', lambda: parse_legacy(body), args.repeat)
+    measure('json', lambda: parse_series_document(body, json.loads), args.repeat)
+
+    orjson = optional_import('orjson')
+    if orjson is not None:
+        measure('orjson', lambda: parse_series_document(body, orjson.loads), args.repeat)
+    else:
+        print("  orjson     не установлен")
+
+    ijson = optional_import('ijson')
+    if ijson is not None:
+        measure("stream", lambda: parse_series_stream(io.BytesIO(body)), args.repeat)
+        print(f"  (ijson backend: {ijson.backend})")
+    else:
+        print("  stream     ijson не установлен")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,15 +5,20 @@
 
 import sys
 import time
+import argparse
 import logging
-import yaml
+from contextlib import nullcontext
 from pathlib import Path
 
 # Добавляем src в путь
 sys.path.insert(0, str(Path(__file__).parent / 'src'))
 
-from prometheus_client import PrometheusClient
-from display_manager import DisplayManager
+from startup_profiler import lazy_import, profiler
+
+with profiler.phase("импорт модулей проекта"):
+    from prometheus_client import PrometheusClient
+    from display_manager import DisplayManager
+    from diagnostics import Diagnostics
 
 
 def load_config(config_path: str = "config.yaml") -> dict:
@@ -27,8 +32,11 @@ def load_config(config_path: str = "config.yaml") -> dict:
         Словарь с конфигурацией
     """
     try:
+        yaml = lazy_import('yaml')
+        # C-реализация парсера (libyaml) в разы быстрее чистого Python, если доступна
+        loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
         with open(config_path, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
+            config = yaml.load(f, Loader=loader)
         logging.info(f"Конфигурация загружена из {config_path}")
         return config
     except Exception as e:
@@ -47,32 +55,56 @@ def setup_logging(config: dict):
     level = getattr(logging, log_config.get('level', 'INFO'))
     log_format = log_config.get('format', '[%(asctime)s] %(levelname)s: %(message)s')
 
+    # force: load_config() уже писал в лог, и logging успел настроить root с уровнем WARNING
     logging.basicConfig(
         level=level,
         format=log_format,
-        datefmt='%Y-%m-%d %H:%M:%S'
+        datefmt='%Y-%m-%d %H:%M:%S',
+        force=True
     )
 
 
-def main():
-    """Главная функция"""
+def parse_args() -> argparse.Namespace:
+    """
+    Разобрать аргументы командной строки
 
-    # Загружаем конфигурацию
-    config = load_config()
-    setup_logging(config)
+    Returns:
+        Namespace с аргументами
+    """
+    parser = argparse.ArgumentParser(description="Divoom Plant Monitor")
+    parser.add_argument(
+        '--profile-startup',
+        action='store_true',
+        help="Вывести время импортов и фаз инициализации после первого кадра"
+    )
+    return parser.parse_args()
+
+
+def run_monitor(config: dict, diagnostics: Diagnostics, profile_startup: bool = False):
+    """
+    Основной цикл ротации растений
 
+    Возвращается только при остановке пользователем, критические ошибки пробрасываются
+    наверх в main()
+
+    Args:
+        config: Словарь с конфигурацией
+        diagnostics: Хуки профилирования, вызываемые на каждой ротации
+        profile_startup: Вывести профиль запуска после отображения первого кадра
+    """
     logger = logging.getLogger(__name__)
-    logger.info("=" * 50)
-    logger.info("Divoom Plant Monitor запущен")
-    logger.info("=" * 50)
 
-    # Инициализируем клиенты
-    prometheus_client = PrometheusClient(config['prometheus']['url'])
-    display_manager = DisplayManager(
-        ip_address=config['divoom']['ip_address'],
-        display_size=config['divoom']['display_size'],
-        images_dir=config['paths']['images_dir']
-    )
+    # Инициализируем клиенты (подключение к Divoom продолжается в фоне)
+    with profiler.phase("инициализация клиентов"):
+        prometheus_client = PrometheusClient(
+            config['prometheus']['url'],
+            parser=config['prometheus'].get('parser', 'auto')
+        )
+        display_manager = DisplayManager(
+            ip_address=config['divoom']['ip_address'],
+            display_size=config['divoom']['display_size'],
+            images_dir=config['paths']['images_dir']
+        )
 
     # Параметры ротации
     rotation_interval = config['rotation']['interval']
@@ -84,74 +116,132 @@ def main():
     humidity_config = config['display']['humidity_font']
     background_enabled = config['display']['background']['enabled']
     datetime_config = config['display'].get('datetime')
+    grid_config = config['display'].get('grid') or {}
+    grid_enabled = grid_config.get('enabled', False)
+    page_size = display_manager.grid_page_size(grid_config) if grid_enabled else 1
 
     logger.info(f"Интервал ротации: {rotation_interval} сек")
     logger.info(f"Интервал обновления данных: {query_interval} сек")
     if datetime_config and datetime_config.get('enabled'):
         logger.info("Отображение времени и даты: включено")
+    if grid_enabled:
+        logger.info(f"Режим сетки: {page_size} растений на кадр")
 
     # Основной цикл
-    plants_data = []
+    plants_data = None
+    humidity_colors = []
     plant_index = 0
     last_data_update = 0
+    first_frame_pending = True
 
     try:
         while True:
-            current_time = time.time()
-
-            # Обновляем данные из Prometheus если прошло достаточно времени
-            if current_time - last_data_update >= query_interval or not plants_data:
-                logger.info("Обновление данных из Prometheus...")
-                try:
-                    new_plants_data = prometheus_client.get_plant_humidity(metric)
-
-                    if new_plants_data:
-                        plants_data = new_plants_data
-                        last_data_update = current_time
-                        plant_index = 0  # Сбрасываем индекс при обновлении данных
-                    elif not plants_data:
-                        # Если нет новых данных и вообще нет данных - ждем
-                        logger.warning("Не удалось получить данные о растениях. Повтор через 30 сек...")
-                        time.sleep(30)
-                        continue
-                    else:
-                        # Если нет новых данных, но есть старые - продолжаем с ними
-                        logger.warning("Не удалось обновить данные, используем предыдущие")
-                except Exception as e:
-                    logger.error(f"Ошибка при обновлении данных из Prometheus: {e}")
-                    if not plants_data:
-                        logger.warning("Нет данных для отображения. Повтор через 30 сек...")
-                        time.sleep(30)
-                        continue
-
-            # Отображаем текущее растение
-            if plants_data:
-                plant = plants_data[plant_index]
-
-                status_text = "online" if plant['is_online'] else f"OFFLINE ({plant['time_since_update']}s)"
-                logger.info(
-                    f"Отображение [{plant_index + 1}/{len(plants_data)}]: "
-                    f"{plant['device_name']} - {plant['humidity']}% "
-                    f"[min: {plant['threshold_min']}, max: {plant['threshold_max']}] [{status_text}]"
-                )
-
-                success = display_manager.display_plant(
-                    plant_name=plant['device_name'],
-                    humidity=plant['humidity'],
-                    name_config=name_config,
-                    humidity_config=humidity_config,
-                    background_enabled=background_enabled,
-                    threshold_min=plant['threshold_min'],
-                    threshold_max=plant['threshold_max'],
-                    datetime_config=datetime_config,
-                    is_online=plant['is_online']
-                )
-
-                if not success:
-                    logger.error(f"Не удалось отобразить растение {plant['device_name']}")
-
-                # Переходим к следующему растению
-                plant_index = (plant_index + 1) % len(plants_data)
+            diagnostics.begin_rotation()
+            try:
+                current_time = time.time()
+
+                # Обновляем данные из Prometheus если прошло достаточно времени
+                if current_time - last_data_update >= query_interval or not plants_data:
+                    logger.info("Обновление данных из Prometheus...")
+                    try:
+                        fetch_phase = profiler.phase("первый запрос к Prometheus") if first_frame_pending else nullcontext()
+                        with fetch_phase:
+                            new_plants_data = prometheus_client.get_plant_columns(metric)
+
+                        if new_plants_data:
+                            plants_data = new_plants_data
+                            last_data_update = current_time
+                            plant_index = 0  # Сбрасываем индекс при обновлении данных
+                            if grid_enabled:
+                                # Цвета всех растений считаются один раз на обновление, а не на каждый тайл
+                                humidity_colors = display_manager.get_humidity_colors(
+                                    plants_data.humidity,
+                                    plants_data.thresholds_min,
+                                    plants_data.thresholds_max,
+                                    humidity_config
+                                )
+                        elif not plants_data:
+                            # Если нет новых данных и вообще нет данных - ждем
+                            logger.warning("Не удалось получить данные о растениях. Повтор через 30 сек...")
+                            time.sleep(30)
+                            continue
+                        else:
+                            # Если нет новых данных, но есть старые - продолжаем с ними
+                            logger.warning("Не удалось обновить данные, используем предыдущие")
+                    except Exception as e:
+                        logger.error(f"Ошибка при обновлении данных из Prometheus: {e}")
+                        if not plants_data:
+                            logger.warning("Нет данных для отображения. Повтор через 30 сек...")
+                            time.sleep(30)
+                            continue
+
+                # Отображаем страницу сетки
+                if plants_data and grid_enabled:
+                    # Словари собираются только для растений текущей страницы
+                    page_end = min(plant_index + page_size, len(plants_data))
+                    page_plants = [plants_data.plant(index) for index in range(plant_index, page_end)]
+                    page_colors = humidity_colors[plant_index:page_end]
+                    page_count = (len(plants_data) + page_size - 1) // page_size
+
+                    logger.info(
+                        f"Отображение страницы [{plant_index // page_size + 1}/{page_count}]: "
+                        + ", ".join(f"{p['device_name']} {p['humidity']}%" for p in page_plants)
+                    )
+
+                    frame_phase = profiler.phase("первый кадр (рендер + отправка)") if first_frame_pending else nullcontext()
+                    with frame_phase:
+                        success = display_manager.display_grid(
+                            plants=page_plants,
+                            colors=page_colors,
+                            grid_config=grid_config,
+                            background_enabled=background_enabled
+                        )
+
+                    if not success:
+                        logger.error("Не удалось отобразить страницу сетки растений")
+
+                    # Переходим к следующей странице
+                    plant_index += page_size
+                    if plant_index >= len(plants_data):
+                        plant_index = 0
+
+                # Отображаем текущее растение
+                elif plants_data:
+                    plant = plants_data.plant(plant_index)
+
+                    status_text = "online" if plant['is_online'] else f"OFFLINE ({plant['time_since_update']}s)"
+                    logger.info(
+                        f"Отображение [{plant_index + 1}/{len(plants_data)}]: "
+                        f"{plant['device_name']} - {plant['humidity']}% "
+                        f"[min: {plant['threshold_min']}, max: {plant['threshold_max']}] [{status_text}]"
+                    )
+
+                    frame_phase = profiler.phase("первый кадр (рендер + отправка)") if first_frame_pending else nullcontext()
+                    with frame_phase:
+                        success = display_manager.display_plant(
+                            plant_name=plant['device_name'],
+                            humidity=plant['humidity'],
+                            name_config=name_config,
+                            humidity_config=humidity_config,
+                            background_enabled=background_enabled,
+                            threshold_min=plant['threshold_min'],
+                            threshold_max=plant['threshold_max'],
+                            datetime_config=datetime_config,
+                            is_online=plant['is_online']
+                        )
+
+                    if not success:
+                        logger.error(f"Не удалось отобразить растение {plant['device_name']}")
+
+                    # Переходим к следующему растению
+                    plant_index = (plant_index + 1) % len(plants_data)
+
+                if plants_data and first_frame_pending:
+                    first_frame_pending = False
+                    if profile_startup:
+                        logger.info(profiler.format_report())
+            finally:
+                diagnostics.end_rotation()
 
             # Ждем перед следующей ротацией
             time.sleep(rotation_interval)
@@ -163,15 +253,59 @@ def main():
         except Exception as e:
             logger.error(f"Ошибка при очистке дисплея: {e}")
 
-    except Exception as e:
-        logger.error(f"Критическая ошибка в главном цикле: {e}", exc_info=True)
-        logger.info("Попытка перезапуска через 30 секунд...")
-        time.sleep(30)
-        # Перезапускаем main()
-        main()
+
+def main(profile_startup: bool = False):
+    """
+    Главная функция: запустить основной цикл под супервизором
+
+    После критической ошибки цикл перезапускается с перечитанным конфигом
+    в той же итерации while, без роста стека
+
+    Args:
+        profile_startup: Вывести профиль запуска после отображения первого кадра
+    """
+
+    # Загружаем конфигурацию
+    with profiler.phase("загрузка конфигурации"):
+        config = load_config()
+    setup_logging(config)
+
+    logger = logging.getLogger(__name__)
+    logger.info("=" * 50)
+    logger.info("Divoom Plant Monitor запущен")
+    logger.info("=" * 50)
+
+    # Диагностика живет весь процесс, чтобы снимки памяти сравнивались между перезапусками
+    diagnostics = Diagnostics.from_config(config.get('diagnostics') or {})
+    diagnostics.install_signal_handlers()
+
+    restarts = 0
+    while True:
+        try:
+            run_monitor(config, diagnostics, profile_startup and restarts == 0)
+            break
+        except KeyboardInterrupt:
+            logger.info("Остановка по запросу пользователя")
+            break
+        except Exception as e:
+            restarts += 1
+            logger.error(f"Критическая ошибка в главном цикле: {e}", exc_info=True)
+            logger.info(f"Попытка перезапуска #{restarts} через 30 секунд...")
+            try:
+                time.sleep(30)
+            except KeyboardInterrupt:
+                logger.info("Остановка по запросу пользователя")
+                break
+
+            # load_config завершает процесс при ошибке, а супервизор должен продолжать работу
+            try:
+                config = load_config()
+            except SystemExit:
+                logger.warning("Не удалось перечитать конфигурацию, используется предыдущая")
 
     logger.info("Divoom Plant Monitor завершен")
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(profile_startup=args.profile_startup)
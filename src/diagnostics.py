@@ -0,0 +1,224 @@
+"""
+Модуль для диагностики долгоживущего процесса: профилирование и анализ памяти по сигналу
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import signal
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from startup_profiler import lazy_import
+
+if TYPE_CHECKING:
+    import cProfile
+    import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+
+class Diagnostics:
+    """
+    Хуки профилирования главного цикла
+
+    SIGUSR1 - включить cProfile на следующие N ротаций (повторный сигнал - остановить досрочно)
+    SIGUSR2 - снять снимок tracemalloc: топ аллокаций и разница с предыдущим снимком
+
+    Сигнал только выставляет флаг, а работа выполняется в главном цикле между ротациями.
+    """
+
+    def __init__(
+        self,
+        output_dir: str = "./logs/diagnostics",
+        profile_rotations: int = 30,
+        tracemalloc_top: int = 25,
+        tracemalloc_frames: int = 10,
+        tracemalloc_on_start: bool = False
+    ):
+        """
+        Инициализация диагностики
+
+        Args:
+            output_dir: Папка для отчетов (должна быть доступна снаружи контейнера)
+            profile_rotations: Сколько ротаций профилировать после сигнала
+            tracemalloc_top: Сколько строк выводить в топе аллокаций
+            tracemalloc_frames: Глубина стека, сохраняемая tracemalloc
+            tracemalloc_on_start: Начать отслеживание памяти сразу при запуске
+        """
+        self.output_dir = Path(output_dir)
+        self.profile_rotations = profile_rotations
+        self.tracemalloc_top = tracemalloc_top
+        self.tracemalloc_frames = tracemalloc_frames
+
+        self._profile_requested = threading.Event()
+        self._snapshot_requested = threading.Event()
+        self._profiler: Optional[cProfile.Profile] = None
+        self._rotations_left = 0
+        self._last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+        if tracemalloc_on_start:
+            lazy_import('tracemalloc').start(self.tracemalloc_frames)
+            logger.info("tracemalloc запущен при старте")
+
+    @classmethod
+    def from_config(cls, config: dict) -> "Diagnostics":
+        """
+        Создать диагностику из секции конфига
+
+        Args:
+            config: Секция diagnostics из config.yaml (может быть пустой)
+
+        Returns:
+            Объект Diagnostics
+        """
+        return cls(
+            output_dir=config.get('output_dir', "./logs/diagnostics"),
+            profile_rotations=config.get('profile_rotations', 30),
+            tracemalloc_top=config.get('tracemalloc_top', 25),
+            tracemalloc_frames=config.get('tracemalloc_frames', 10),
+            tracemalloc_on_start=config.get('tracemalloc_on_start', False)
+        )
+
+    def install_signal_handlers(self):
+        """Зарегистрировать обработчики SIGUSR1/SIGUSR2 (на платформах, где они есть)"""
+        sigusr1 = getattr(signal, 'SIGUSR1', None)
+        sigusr2 = getattr(signal, 'SIGUSR2', None)
+        if sigusr1 is None or sigusr2 is None:
+            logger.warning("Сигналы SIGUSR1/SIGUSR2 недоступны, диагностика по сигналу отключена")
+            return
+
+        signal.signal(sigusr1, lambda signum, frame: self.request_profile())
+        signal.signal(sigusr2, lambda signum, frame: self.request_snapshot())
+        logger.info(
+            f"Диагностика: SIGUSR1 - профиль {self.profile_rotations} ротаций, "
+            f"SIGUSR2 - снимок памяти (отчеты в {self.output_dir})"
+        )
+
+    def request_profile(self):
+        """Запросить запуск (или досрочную остановку) профилирования"""
+        self._profile_requested.set()
+
+    def request_snapshot(self):
+        """Запросить снимок памяти"""
+        self._snapshot_requested.set()
+
+    def begin_rotation(self):
+        """Обработать отложенные запросы и включить профайлер перед ротацией"""
+        if self._snapshot_requested.is_set():
+            self._snapshot_requested.clear()
+            self._dump_tracemalloc()
+
+        if self._profile_requested.is_set():
+            self._profile_requested.clear()
+            if self._profiler is None:
+                # cProfile нужен только после сигнала, не загружаем его на старте
+                self._profiler = lazy_import('cProfile').Profile()
+                self._rotations_left = self.profile_rotations
+                logger.info(f"Профилирование запущено на {self.profile_rotations} ротаций")
+            else:
+                logger.info("Профилирование остановлено досрочно по сигналу")
+                self._dump_profile()
+                return
+
+        if self._profiler is not None:
+            self._profiler.enable()
+
+    def end_rotation(self):
+        """Выключить профайлер после ротации и сохранить отчет, если ротации закончились"""
+        if self._profiler is None:
+            return
+
+        self._profiler.disable()
+        self._rotations_left -= 1
+        if self._rotations_left <= 0:
+            self._dump_profile()
+
+    def _report_path(self, prefix: str, suffix: str) -> Path:
+        """
+        Сформировать путь к файлу отчета с отметкой времени
+
+        Args:
+            prefix: Префикс имени файла (profile, tracemalloc)
+            suffix: Расширение файла
+
+        Returns:
+            Путь к файлу отчета
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        # Микросекунды: несколько отчетов за одну секунду не перезаписывают друг друга
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        return self.output_dir / f"{prefix}-{timestamp}{suffix}"
+
+    def _dump_profile(self):
+        """Сохранить результаты cProfile в .prof (для pstats/snakeviz) и текстовую сводку"""
+        profiler = self._profiler
+        self._profiler = None
+        self._rotations_left = 0
+
+        try:
+            prof_path = self._report_path("profile", ".prof")
+            profiler.dump_stats(str(prof_path))
+
+            pstats = lazy_import('pstats')
+            stream = io.StringIO()
+            stats = pstats.Stats(profiler, stream=stream)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(50)
+            prof_path.with_suffix(".txt").write_text(stream.getvalue(), encoding='utf-8')
+
+            logger.info(f"Профиль сохранен: {prof_path}")
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении профиля: {e}")
+
+    def _take_snapshot(self) -> tracemalloc.Snapshot:
+        """
+        Снять снимок памяти без служебных аллокаций tracemalloc и импорта
+
+        Returns:
+            Отфильтрованный снимок
+        """
+        tracemalloc = lazy_import('tracemalloc')
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    def _dump_tracemalloc(self):
+        """Снять снимок памяти и сохранить топ аллокаций и разницу с предыдущим снимком"""
+        tracemalloc = lazy_import('tracemalloc')
+        if not tracemalloc.is_tracing():
+            # Аллокации до запуска не отслеживаются, поэтому первый снимок - только точка отсчета
+            tracemalloc.start(self.tracemalloc_frames)
+            logger.info("tracemalloc запущен, следующий сигнал сохранит снимок памяти")
+            self._last_snapshot = self._take_snapshot()
+            return
+
+        try:
+            snapshot = self._take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+
+            lines = [
+                f"Снимок памяти {datetime.now().isoformat(timespec='seconds')}",
+                f"Текущая память: {current / 1024:.1f} KiB, пик: {peak / 1024:.1f} KiB",
+                "",
+                f"Топ {self.tracemalloc_top} аллокаций по строкам:",
+            ]
+            for stat in snapshot.statistics('lineno')[:self.tracemalloc_top]:
+                lines.append(f"  {stat}")
+
+            if self._last_snapshot is not None:
+                lines.append("")
+                lines.append(f"Топ {self.tracemalloc_top} изменений с предыдущего снимка:")
+                for stat in snapshot.compare_to(self._last_snapshot, 'lineno')[:self.tracemalloc_top]:
+                    lines.append(f"  {stat}")
+
+            self._last_snapshot = snapshot
+
+            path = self._report_path("tracemalloc", ".txt")
+            path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+            logger.info(f"Снимок памяти сохранен: {path}")
+        except Exception as e:
+            logger.error(f"Ошибка при снятии снимка памяти: {e}")
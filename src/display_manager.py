@@ -2,15 +2,21 @@
 Модуль для работы с Divoom дисплеем
 """
 
+from __future__ import annotations
+
 import os
 import logging
 import socket
-from typing import Optional, Tuple
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
 from pathlib import Path
 from datetime import datetime
 
-from PIL import Image, ImageDraw, ImageFont
-from pixoo import Pixoo
+from startup_profiler import lazy_import, profiler
+
+if TYPE_CHECKING:
+    from PIL import Image, ImageFont
+    from pixoo import Pixoo
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +29,67 @@ MONTH_NAMES_RU = {
     7: "июл", 8: "авг", 9: "сен", 10: "окт", 11: "ноя", 12: "дек"
 }
 
+# Сколько ждать фонового подключения к Divoom перед отправкой кадра (секунды)
+CONNECT_WAIT_TIMEOUT = 10.0
+
+
+def _pil_image():
+    """PIL.Image загружается при первом рендере, а не при импорте модуля"""
+    return lazy_import('PIL.Image')
+
+
+def _pil_draw():
+    """PIL.ImageDraw загружается при первом рендере"""
+    return lazy_import('PIL.ImageDraw')
+
+
+def _pil_font():
+    """PIL.ImageFont загружается при первом рендере"""
+    return lazy_import('PIL.ImageFont')
+
+
+def _humidity_palette(humidity_config: dict) -> Tuple[Tuple[int, int, int], ...]:
+    """
+    Разобрать цвета уровней влажности из конфига
+
+    Args:
+        humidity_config: Конфигурация шрифта влажности
+
+    Returns:
+        Кортеж RGB цветов (low, normal, high)
+    """
+    colors = humidity_config.get('colors', {})
+    return (
+        tuple(colors.get('low', [255, 50, 50])),  # Низкая влажность - красный
+        tuple(colors.get('normal', [50, 255, 100])),  # Нормальная влажность - зеленый
+        tuple(colors.get('high', [100, 150, 255])),  # Высокая влажность - синий
+    )
+
+
+def _classify_humidity(
+    humidity: int,
+    threshold_min: int,
+    threshold_max: int,
+    palette: Tuple[Tuple[int, int, int], ...]
+) -> Tuple[str, Tuple[int, int, int]]:
+    """
+    Определить уровень влажности и его цвет
+
+    Args:
+        humidity: Текущая влажность
+        threshold_min: Минимальный порог
+        threshold_max: Максимальный порог
+        palette: Цвета (low, normal, high) из _humidity_palette
+
+    Returns:
+        Кортеж (уровень LOW/NORMAL/HIGH, RGB цвет)
+    """
+    if humidity < threshold_min:
+        return "LOW", palette[0]
+    if humidity > threshold_max:
+        return "HIGH", palette[2]
+    return "NORMAL", palette[1]
+
 
 class DisplayManager:
     """Менеджер для отображения информации на Divoom"""
@@ -39,10 +106,64 @@ class DisplayManager:
         self.ip_address = ip_address
         self.display_size = display_size
         self.images_dir = Path(images_dir)
-        self.pixoo = Pixoo(ip_address)
+        self.pixoo: Optional[Pixoo] = None
+
+        # Миниатюры фонов для режима сетки: (имя растения, размер тайла) -> (mtime файла, Image)
+        self._thumbnail_cache: Dict[Tuple[str, int], Tuple[float, Image.Image]] = {}
+
+        # Подключение к устройству идет в фоне, чтобы не блокировать старт
+        self._connect_lock = threading.Lock()
+        self._connected = threading.Event()
+        self._connect_thread: Optional[threading.Thread] = None
+        self._start_connect()
 
         logger.info(f"DisplayManager инициализирован для {ip_address}")
 
+    def _start_connect(self):
+        """Запустить фоновое подключение к Divoom, если оно еще не идет"""
+        with self._connect_lock:
+            if self._connect_thread is not None and self._connect_thread.is_alive():
+                return
+            self._connected.clear()
+            self._connect_thread = threading.Thread(
+                target=self._connect, name="pixoo-connect", daemon=True
+            )
+            self._connect_thread.start()
+
+    def _connect(self):
+        """Импортировать pixoo и подключиться к устройству (выполняется в фоновом потоке)"""
+        try:
+            pixoo_module = lazy_import('pixoo')
+            with profiler.phase("подключение к Divoom"):
+                self.pixoo = pixoo_module.Pixoo(self.ip_address)
+            logger.info(f"Подключение к Divoom {self.ip_address} установлено")
+        except Exception as e:
+            logger.error(f"Ошибка при подключении к Divoom {self.ip_address}: {e}")
+        finally:
+            self._connected.set()
+
+    def _get_pixoo(self, timeout: float = CONNECT_WAIT_TIMEOUT) -> Optional[Pixoo]:
+        """
+        Дождаться фонового подключения к Divoom
+
+        Args:
+            timeout: Максимальное время ожидания (секунды)
+
+        Returns:
+            Объект Pixoo или None, если подключение еще не готово или не удалось
+        """
+        if self.pixoo is not None:
+            return self.pixoo
+
+        if not self._connected.wait(timeout):
+            logger.warning(f"Подключение к Divoom {self.ip_address} еще не установлено")
+            return None
+
+        if self.pixoo is None:
+            # Предыдущая попытка не удалась - пробуем снова в фоне
+            self._start_connect()
+        return self.pixoo
+
     def _load_background(self, plant_name: str) -> Optional[Image.Image]:
         """
         Загрузить фоновое изображение для растения
@@ -58,6 +179,7 @@ class DisplayManager:
             image_path = self.images_dir / f"{plant_name}{ext}"
             if image_path.exists():
                 try:
+                    Image = _pil_image()
                     img = Image.open(image_path)
                     # Убедимся, что изображение нужного размера
                     if img.size != (self.display_size, self.display_size):
@@ -88,6 +210,8 @@ class DisplayManager:
         Returns:
             PIL Font объект
         """
+        ImageFont = _pil_font()
+
         # Если указан пользовательский шрифт - пробуем его первым
         if custom_font_path and os.path.exists(custom_font_path):
             try:
@@ -114,6 +238,39 @@ class DisplayManager:
         logger.warning("Используется дефолтный шрифт")
         return ImageFont.load_default()
 
+    def get_humidity_colors(
+        self,
+        humidities: Sequence[int],
+        thresholds_min: Sequence[int],
+        thresholds_max: Sequence[int],
+        humidity_config: dict
+    ) -> List[Tuple[int, int, int]]:
+        """
+        Определить цвета влажности для всех растений за один проход
+
+        Цвета из конфига разбираются один раз, затем все растения классифицируются
+        одним проходом по параллельным колонкам через _classify_humidity
+
+        Args:
+            humidities: Влажность растений
+            thresholds_min: Минимальные пороги
+            thresholds_max: Максимальные пороги
+            humidity_config: Конфигурация шрифта влажности
+
+        Returns:
+            Список RGB цветов в том же порядке
+        """
+        # Проверяем, включен ли динамический выбор цвета
+        if not humidity_config.get('dynamic_color', False):
+            return [tuple(humidity_config.get('color', [100, 200, 255]))] * len(humidities)
+
+        palette = _humidity_palette(humidity_config)
+
+        return [
+            _classify_humidity(humidity, threshold_min, threshold_max, palette)[1]
+            for humidity, threshold_min, threshold_max in zip(humidities, thresholds_min, thresholds_max)
+        ]
+
     def _get_humidity_color(
         self,
         humidity: int,
@@ -137,28 +294,16 @@ class DisplayManager:
         if not humidity_config.get('dynamic_color', False):
             return tuple(humidity_config.get('color', [100, 200, 255]))
 
-        colors = humidity_config.get('colors', {})
-
-        # Определяем уровень влажности
-        if humidity < threshold_min:
-            # Низкая влажность - красный
-            color = colors.get('low', [255, 50, 50])
-            level = "LOW"
-        elif humidity > threshold_max:
-            # Высокая влажность - синий
-            color = colors.get('high', [100, 150, 255])
-            level = "HIGH"
-        else:
-            # Нормальная влажность - зеленый
-            color = colors.get('normal', [50, 255, 100])
-            level = "NORMAL"
+        level, color = _classify_humidity(
+            humidity, threshold_min, threshold_max, _humidity_palette(humidity_config)
+        )
 
         logger.debug(
             f"Выбран цвет для влажности {humidity}% "
             f"(min: {threshold_min}, max: {threshold_max}): {level} {color}"
         )
 
-        return tuple(color)
+        return color
 
     def _format_time(self) -> str:
         """
@@ -211,6 +356,9 @@ class DisplayManager:
         Returns:
             PIL Image готовое для отображения
         """
+        Image = _pil_image()
+        ImageDraw = _pil_draw()
+
         # Создаем базовое изображение (черный фон или картинка растения)
         if background_enabled:
             img = self._load_background(plant_name)
@@ -345,32 +493,260 @@ class DisplayManager:
                 plant_name, humidity, name_config, humidity_config,
                 background_enabled, threshold_min, threshold_max, datetime_config, is_online
             )
+        except Exception as e:
+            logger.error(f"Ошибка при отображении растения {plant_name}: {e}")
+            return False
 
-            # Отправляем изображение на дисплей
-            self.pixoo.draw_image(img)
-            self.pixoo.push()
+        if not self._push(img, f"растения {plant_name}"):
+            return False
+
+        logger.debug(f"Отображено: {plant_name} - {humidity}%")
+        return True
+
+    def _push(self, img: Image.Image, label: str) -> bool:
+        """
+        Отправить готовый кадр на дисплей
+
+        Args:
+            img: Кадр размера display_size x display_size
+            label: Что отображается (для сообщений об ошибках)
+
+        Returns:
+            True если успешно, False в случае ошибки
+        """
+        try:
+            pixoo = self._get_pixoo()
+            if pixoo is None:
+                logger.error(f"Ошибка при отображении {label}: Divoom не подключен")
+                return False
 
-            logger.debug(f"Отображено: {plant_name} - {humidity}%")
+            pixoo.draw_image(img)
+            pixoo.push()
             return True
 
         except socket.timeout:
-            logger.error(f"Ошибка при отображении растения {plant_name}: Timeout соединения с Divoom")
+            logger.error(f"Ошибка при отображении {label}: Timeout соединения с Divoom")
             return False
         except ConnectionError as e:
-            logger.error(f"Ошибка при отображении растения {plant_name}: Ошибка соединения - {e}")
+            logger.error(f"Ошибка при отображении {label}: Ошибка соединения - {e}")
             return False
         except OSError as e:
-            logger.error(f"Ошибка при отображении растения {plant_name}: Сетевая ошибка - {e}")
+            logger.error(f"Ошибка при отображении {label}: Сетевая ошибка - {e}")
             return False
         except Exception as e:
-            logger.error(f"Ошибка при отображении растения {plant_name}: {e}")
+            logger.error(f"Ошибка при отображении {label}: {e}")
+            return False
+
+    def _find_background(self, plant_name: str) -> Optional[Path]:
+        """
+        Найти файл фонового изображения растения
+
+        Args:
+            plant_name: Имя растения
+
+        Returns:
+            Путь к изображению или None, если его нет
+        """
+        for ext in ['.png', '.jpg', '.jpeg', '.PNG', '.JPG', '.JPEG']:
+            image_path = self.images_dir / f"{plant_name}{ext}"
+            if image_path.exists():
+                return image_path
+        return None
+
+    def _get_thumbnail(self, plant_name: str, tile_size: int, background_enabled: bool) -> Image.Image:
+        """
+        Получить миниатюру фона растения для тайла сетки (с кэшированием)
+
+        Миниатюра пересоздается, если файл изображения изменился (по mtime),
+        отсутствующие изображения не кэшируются, чтобы подхватить добавленные на лету
+
+        Args:
+            plant_name: Имя растения
+            tile_size: Размер тайла в пикселях
+            background_enabled: Использовать ли фоновое изображение
+
+        Returns:
+            PIL Image размера tile_size x tile_size (не изменять - объект из кэша)
+        """
+        Image = _pil_image()
+        key = (plant_name, tile_size)
+
+        image_path = self._find_background(plant_name) if background_enabled else None
+        try:
+            mtime = image_path.stat().st_mtime if image_path is not None else None
+        except OSError:
+            mtime = None
+
+        if mtime is None:
+            self._thumbnail_cache.pop(key, None)
+            return Image.new('RGB', (tile_size, tile_size), color=(0, 0, 0))
+
+        cached = self._thumbnail_cache.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        background = self._load_background(plant_name)
+        if background is None:
+            return Image.new('RGB', (tile_size, tile_size), color=(0, 0, 0))
+
+        thumbnail = background.resize((tile_size, tile_size), Image.Resampling.LANCZOS)
+        self._thumbnail_cache[key] = (mtime, thumbnail)
+        logger.debug(f"Создана миниатюра {tile_size}x{tile_size} для {plant_name}")
+        return thumbnail
+
+    def _fit_text(self, text: str, font: ImageFont.FreeTypeFont, max_width: int, stroke_width: int = 0) -> str:
+        """
+        Обрезать текст по ширине в пикселях
+
+        Args:
+            text: Исходный текст
+            font: Шрифт, которым текст будет нарисован
+            max_width: Доступная ширина в пикселях
+            stroke_width: Толщина обводки (добавляется с обеих сторон)
+
+        Returns:
+            Самый длинный префикс текста, помещающийся в max_width
+        """
+        while text and font.getlength(text) + 2 * stroke_width > max_width:
+            text = text[:-1]
+        return text
+
+    def grid_page_size(self, grid_config: dict) -> int:
+        """
+        Количество растений на одной странице сетки
+
+        Args:
+            grid_config: Конфиг сетки (size: 2 = 2x2, 4 = 4x4)
+
+        Returns:
+            Количество тайлов в кадре
+        """
+        size = max(1, int(grid_config.get('size', 2)))
+        return size * size
+
+    def create_grid_image(
+        self,
+        plants: List[Dict],
+        colors: Sequence[Tuple[int, int, int]],
+        grid_config: dict,
+        background_enabled: bool = True
+    ) -> Image.Image:
+        """
+        Создать кадр-сетку с несколькими растениями
+
+        Каждый тайл - миниатюра фона, имя растения (обрезанное по ширине тайла) и влажность
+        цветом по порогам (или ERR красным, если датчик офлайн). Шрифты загружаются один раз на кадр
+
+        Args:
+            plants: Растения страницы (не больше grid_page_size), словари из PrometheusClient
+            colors: Цвета влажности для этих растений (из get_humidity_colors)
+            grid_config: Конфиг сетки (size, name_font, humidity_font)
+            background_enabled: Использовать ли фоновые изображения
+
+        Returns:
+            PIL Image готовое для отображения
+        """
+        Image = _pil_image()
+        ImageDraw = _pil_draw()
+
+        size = max(1, int(grid_config.get('size', 2)))
+        tile_size = self.display_size // size
+
+        name_conf = grid_config.get('name_font', {})
+        name_font = self._get_font(name_conf.get('size', 8), name_conf.get('font_path'))
+        name_color = tuple(name_conf.get('color', [255, 255, 255]))
+        name_pos = tuple(name_conf.get('position', [1, 0]))
+        name_stroke_width = name_conf.get('stroke_width', 0)
+        name_stroke_color = tuple(name_conf.get('stroke_color', [0, 0, 0]))
+        name_max_width = tile_size - name_pos[0]
+
+        humidity_conf = grid_config.get('humidity_font', {})
+        humidity_size = humidity_conf.get('size', 8)
+        humidity_font = self._get_font(humidity_size, humidity_conf.get('font_path'))
+        humidity_pos = tuple(humidity_conf.get('position', [1, tile_size - humidity_size - 1]))
+        humidity_stroke_width = humidity_conf.get('stroke_width', 0)
+        humidity_stroke_color = tuple(humidity_conf.get('stroke_color', [0, 0, 0]))
+        # В тайлах 16x16 знак % не помещается, его можно отключить
+        humidity_suffix = "%" if humidity_conf.get('percent_sign', True) else ""
+
+        img = Image.new('RGB', (self.display_size, self.display_size), color=(0, 0, 0))
+
+        # Каждый тайл рисуется отдельно и вставляется в кадр, поэтому текст не вылезает к соседям
+        for index, (plant, color) in enumerate(zip(plants[:size * size], colors)):
+            tile = self._get_thumbnail(plant['device_name'], tile_size, background_enabled).copy()
+            draw = ImageDraw.Draw(tile)
+
+            draw.text(
+                name_pos,
+                self._fit_text(plant['device_name'], name_font, name_max_width, name_stroke_width),
+                fill=name_color,
+                font=name_font,
+                stroke_width=name_stroke_width,
+                stroke_fill=name_stroke_color
+            )
+
+            if plant.get('is_online', True):
+                humidity_text = f"{plant['humidity']}{humidity_suffix}"
+                humidity_color = color
+            else:
+                # Датчик офлайн - показываем ERR красным цветом
+                humidity_text = "ERR"
+                humidity_color = (255, 0, 0)
+
+            draw.text(
+                humidity_pos,
+                humidity_text,
+                fill=humidity_color,
+                font=humidity_font,
+                stroke_width=humidity_stroke_width,
+                stroke_fill=humidity_stroke_color
+            )
+
+            img.paste(tile, ((index % size) * tile_size, (index // size) * tile_size))
+
+        logger.debug(f"Создана сетка {size}x{size} для {min(len(plants), size * size)} растений")
+        return img
+
+    def display_grid(
+        self,
+        plants: List[Dict],
+        colors: Sequence[Tuple[int, int, int]],
+        grid_config: dict,
+        background_enabled: bool = True
+    ) -> bool:
+        """
+        Отобразить страницу сетки растений на дисплее
+
+        Args:
+            plants: Растения страницы
+            colors: Цвета влажности для этих растений (из get_humidity_colors)
+            grid_config: Конфиг сетки
+            background_enabled: Использовать ли фоновые изображения
+
+        Returns:
+            True если успешно, False в случае ошибки
+        """
+        try:
+            img = self.create_grid_image(plants, colors, grid_config, background_enabled)
+        except Exception as e:
+            logger.error(f"Ошибка при отображении сетки растений: {e}")
+            return False
+
+        if not self._push(img, "сетки растений"):
             return False
 
+        logger.debug(f"Отображена сетка: {', '.join(p['device_name'] for p in plants)}")
+        return True
+
     def clear(self):
         """Очистить дисплей"""
         try:
-            self.pixoo.clear()
-            self.pixoo.push()
+            pixoo = self._get_pixoo()
+            if pixoo is None:
+                logger.warning("Дисплей не очищен: Divoom не подключен")
+                return
+            pixoo.clear()
+            pixoo.push()
             logger.debug("Дисплей очищен")
         except Exception as e:
             logger.error(f"Ошибка при очистке дисплея: {e}")
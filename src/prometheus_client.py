@@ -2,162 +2,462 @@
 Модуль для работы с Prometheus API
 """
 
-import requests
-from typing import Dict, List, Optional
+from array import array
+from functools import lru_cache
+from types import ModuleType
+from typing import BinaryIO, Callable, Dict, List, Optional, Union
+import json
 import logging
 import time
 
+from startup_profiler import lazy_import
+
 logger = logging.getLogger(__name__)
 
+# Доступные парсеры ответа: auto выбирает лучший из установленных
+PARSERS = ('auto', 'stream', 'orjson', 'json')
+
+
+@lru_cache(maxsize=None)
+def optional_import(name: str) -> Optional[ModuleType]:
+    """
+    Импортировать опциональную зависимость (результат кэшируется)
+
+    Args:
+        name: Имя модуля (ijson, orjson)
+
+    Returns:
+        Модуль или None, если он не установлен
+    """
+    try:
+        return lazy_import(name)
+    except ImportError:
+        return None
+
+
+def resolve_parser(parser: str = 'auto') -> str:
+    """
+    Выбрать парсер ответа Prometheus с учетом установленных библиотек
+
+    auto: потоковый ijson (только с C-бэкендом, чистый Python слишком медленный),
+    затем orjson, затем стандартный json
+
+    Args:
+        parser: Запрошенный парсер (auto, stream, orjson, json)
+
+    Returns:
+        Имя доступного парсера (stream, orjson или json)
+    """
+    if parser not in PARSERS:
+        logger.warning(f"Неизвестный парсер '{parser}', используется auto")
+        parser = 'auto'
+
+    if parser == 'auto':
+        ijson = optional_import('ijson')
+        if ijson is not None and ijson.backend.startswith('yajl2_c'):
+            return 'stream'
+        return 'orjson' if optional_import('orjson') is not None else 'json'
+
+    module_name = 'ijson' if parser == 'stream' else parser
+    if optional_import(module_name) is None:
+        logger.warning(f"Парсер '{parser}' недоступен ({module_name} не установлен), используется json")
+        return 'json'
+    return parser
+
+
+def _to_int(raw_value: Optional[str]) -> int:
+    """Значение сэмпла Prometheus ("54.5") в целое число"""
+    return int(float(raw_value)) if raw_value else 0
+
+
+def _to_float(raw_value: Optional[str]) -> float:
+    """Значение сэмпла Prometheus в число с плавающей точкой"""
+    return float(raw_value) if raw_value else 0.0
+
+
+class SeriesColumns:
+    """
+    Колоночный результат instant query: только device_id, device_name и значение
+
+    Вместо списка словарей с копиями всех меток хранятся три параллельных массива,
+    значения - в компактном array ('i' для влажности и порогов, 'd' для timestamp)
+    """
+
+    __slots__ = ('device_ids', 'device_names', 'values', 'strict', '_convert')
+
+    def __init__(self, typecode: str = 'i', strict: bool = False):
+        """
+        Инициализация пустых колонок
+
+        Args:
+            typecode: Тип значений array ('i' - целые, 'd' - float)
+            strict: Пропускать серии без device_id или с пустым значением
+                    (для порогов, чтобы у таких растений остались значения по умолчанию)
+        """
+        self.device_ids: List[str] = []
+        self.device_names: List[str] = []
+        self.values = array(typecode)
+        self.strict = strict
+        self._convert: Callable[[Optional[str]], Union[int, float]] = _to_int if typecode == 'i' else _to_float
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def append_series(self, item: dict):
+        """
+        Добавить один элемент data.result, взяв из него только нужные поля
+
+        Args:
+            item: Элемент результата {'metric': {...}, 'value': [ts, "value"]}
+        """
+        labels = item.get('metric', {})
+        raw_value = item.get('value', (None, None))[1]
+        if self.strict and not (labels.get('device_id') and raw_value):
+            return
+
+        value = self._convert(raw_value)
+        # Значение конвертируется первым, чтобы при ошибке колонки не разъехались
+        self.values.append(value)
+        self.device_ids.append(labels.get('device_id', 'unknown'))
+        self.device_names.append(labels.get('device_name', 'Unknown'))
+
+    def sorted_by_name(self) -> "SeriesColumns":
+        """
+        Копия колонок, отсортированная по device_name
+
+        Returns:
+            Новые колонки в порядке имен
+        """
+        order = sorted(range(len(self)), key=self.device_names.__getitem__)
+        columns = SeriesColumns(self.values.typecode, self.strict)
+        columns.device_ids = [self.device_ids[i] for i in order]
+        columns.device_names = [self.device_names[i] for i in order]
+        columns.values = array(self.values.typecode, (self.values[i] for i in order))
+        return columns
+
+    def as_dict(self) -> Dict[str, Union[int, float]]:
+        """
+        Значения по device_id
+
+        Returns:
+            Словарь {device_id: значение}
+        """
+        return dict(zip(self.device_ids, self.values))
+
+
+class _HeadRecorder:
+    """Файлоподобная обертка над потоком, запоминающая его начало"""
+
+    def __init__(self, stream: BinaryIO, limit: int = 4096):
+        """
+        Инициализация обертки
+
+        Args:
+            stream: Исходный поток
+            limit: Сколько первых байт запоминать
+        """
+        self._stream = stream
+        self._limit = limit
+        self.head = b''
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._stream.read(size)
+        if len(self.head) < self._limit:
+            self.head += chunk[:self._limit - len(self.head)]
+        return chunk
+
+
+def _extend_columns(columns: SeriesColumns, items) -> SeriesColumns:
+    """
+    Заполнить колонки из итератора элементов data.result, пропуская битые сэмплы
+
+    Args:
+        columns: Колонки для заполнения
+        items: Итератор элементов результата
+
+    Returns:
+        Заполненные колонки
+    """
+    for item in items:
+        try:
+            columns.append_series(item)
+        except (ValueError, OverflowError, IndexError, KeyError, TypeError) as e:
+            logger.error(f"Ошибка при парсинге серии: {e}")
+    return columns
+
+
+def parse_series_stream(
+    stream: BinaryIO,
+    typecode: str = 'i',
+    strict: bool = False
+) -> Optional[SeriesColumns]:
+    """
+    Потоково разобрать ответ Prometheus через ijson
+
+    В памяти одновременно находится только одна серия, а не весь документ.
+    Ответ с ошибкой не содержит серий и короткий, поэтому status проверяется
+    по запомненному началу потока, только если серий не нашлось
+
+    Args:
+        stream: Файлоподобный объект с телом ответа
+        typecode: Тип значений ('i' или 'd')
+        strict: Пропускать серии без device_id или с пустым значением
+
+    Returns:
+        Колонки с результатами или None, если Prometheus вернул ошибку
+    """
+    ijson = optional_import('ijson')
+    recorder = _HeadRecorder(stream)
+    items = ijson.items(recorder, 'data.result.item', use_float=True)
+    columns = _extend_columns(SeriesColumns(typecode, strict), items)
+
+    if not columns:
+        try:
+            data = json.loads(recorder.head)
+        except ValueError:
+            # Начало длиннее лимита - это не короткий ответ с ошибкой
+            return columns
+        if data.get('status') != 'success':
+            logger.error(f"Prometheus вернул ошибку: {data.get('error', data.get('status'))}")
+            return None
+
+    return columns
+
+
+def parse_series_document(
+    body: bytes,
+    loads: Callable,
+    typecode: str = 'i',
+    strict: bool = False
+) -> Optional[SeriesColumns]:
+    """
+    Разобрать ответ Prometheus целиком (orjson или json) в колонки
+
+    Args:
+        body: Тело ответа
+        loads: Функция разбора JSON (orjson.loads или json.loads)
+        typecode: Тип значений ('i' или 'd')
+        strict: Пропускать серии без device_id или с пустым значением
+
+    Returns:
+        Колонки с результатами или None, если Prometheus вернул ошибку
+    """
+    data = loads(body)
+
+    if data.get('status') != 'success':
+        logger.error(f"Prometheus вернул ошибку: {data.get('error', data.get('status'))}")
+        return None
+
+    return _extend_columns(SeriesColumns(typecode, strict), data.get('data', {}).get('result', []))
+
+
+class PlantColumns:
+    """
+    Данные о растениях в колонках: влажность и пороги выровнены по индексу
+
+    Словарь растения собирается только по запросу (plant), поэтому для
+    классификации цветов всего парка достаточно колонок humidity и порогов
+    """
+
+    __slots__ = (
+        'device_ids', 'device_names', 'humidity', 'thresholds_min', 'thresholds_max',
+        'is_online', 'last_success_timestamp', 'time_since_update'
+    )
+
+    def __init__(
+        self,
+        humidity_data: SeriesColumns,
+        thresholds_min: Dict[str, int],
+        thresholds_max: Dict[str, int],
+        last_success_timestamp: float,
+        time_since_update: float
+    ):
+        """
+        Собрать колонки растений
+
+        Args:
+            humidity_data: Колонки влажности, отсортированные по имени
+            thresholds_min: Минимальные пороги по device_id
+            thresholds_max: Максимальные пороги по device_id
+            last_success_timestamp: Timestamp последнего успешного обновления экспортера
+            time_since_update: Сколько секунд прошло с этого обновления
+        """
+        self.device_ids = humidity_data.device_ids
+        self.device_names = humidity_data.device_names
+        self.humidity = humidity_data.values
+        self.thresholds_min = array('i', (thresholds_min.get(d, 30) for d in self.device_ids))  # По умолчанию 30
+        self.thresholds_max = array('i', (thresholds_max.get(d, 80) for d in self.device_ids))  # По умолчанию 80
+        self.last_success_timestamp = last_success_timestamp
+        self.time_since_update = int(time_since_update)
+        self.is_online = time_since_update <= 120  # Онлайн если обновлялось менее 120 сек назад
+
+    def __len__(self) -> int:
+        return len(self.humidity)
+
+    def plant(self, index: int) -> Dict:
+        """
+        Собрать словарь одного растения
+
+        Args:
+            index: Индекс растения (в порядке имен)
+
+        Returns:
+            Словарь в формате get_plant_humidity
+        """
+        return {
+            'device_id': self.device_ids[index],
+            'device_name': self.device_names[index],
+            'humidity': self.humidity[index],
+            'threshold_min': self.thresholds_min[index],
+            'threshold_max': self.thresholds_max[index],
+            'is_online': self.is_online,
+            'last_success_timestamp': self.last_success_timestamp,
+            'time_since_update': self.time_since_update
+        }
+
 
 class PrometheusClient:
     """Клиент для работы с Prometheus API"""
 
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, parser: str = 'auto'):
         """
         Инициализация клиента
 
         Args:
             base_url: Базовый URL Prometheus (например: https://prometheus.artfaal.ru)
+            parser: Парсер ответов (auto, stream, orjson, json)
         """
         self.base_url = base_url.rstrip('/')
         self.api_url = f"{self.base_url}/api/v1"
+        self.parser = parser
+        self._resolved_parser: Optional[str] = None
 
-    def query(self, metric: str) -> Optional[Dict]:
+    def query_series(self, metric: str, typecode: str = 'i', strict: bool = False) -> Optional[SeriesColumns]:
         """
-        Выполнить instant query к Prometheus
+        Выполнить instant query и разобрать ответ в колонки без промежуточных словарей
 
         Args:
-            metric: Название метрики (например: tuya_plant_humidity)
+            metric: Название метрики или PromQL выражение
+            typecode: Тип значений ('i' - целые, 'd' - float)
+            strict: Пропускать серии без device_id или с пустым значением
 
         Returns:
-            Словарь с результатами или None в случае ошибки
+            Колонки с результатами или None в случае ошибки
         """
+        # requests загружается при первом запросе, а не при старте процесса
+        requests = lazy_import('requests')
+        # При потоковом чтении обрыв соединения приходит ошибкой urllib3, а не requests
+        urllib3_exceptions = lazy_import('urllib3.exceptions')
+
+        # Парсер выбирается при первом запросе, чтобы не импортировать библиотеки на старте
+        if self._resolved_parser is None:
+            self._resolved_parser = resolve_parser(self.parser)
+            logger.info(f"Парсер ответов Prometheus: {self._resolved_parser}")
+        parser = self._resolved_parser
+
         url = f"{self.api_url}/query"
         params = {'query': metric}
+        parse_errors = (ValueError, OverflowError)
+        ijson = optional_import('ijson')
+        if ijson is not None:
+            parse_errors += (ijson.JSONError,)
 
         try:
-            logger.debug(f"Запрос к Prometheus: {url}?query={metric}")
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
+            logger.debug(f"Запрос к Prometheus: {url}?query={metric} (парсер: {parser})")
+            with requests.get(url, params=params, timeout=10, stream=parser == 'stream') as response:
+                response.raise_for_status()
 
-            data = response.json()
+                if parser == 'stream':
+                    # Распаковываем gzip на лету, тело не собирается в память целиком
+                    response.raw.decode_content = True
+                    return parse_series_stream(response.raw, typecode, strict)
 
-            if data.get('status') != 'success':
-                logger.error(f"Prometheus вернул ошибку: {data}")
-                return None
+                loads = optional_import(parser).loads
+                return parse_series_document(response.content, loads, typecode, strict)
 
-            return data
-
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, urllib3_exceptions.HTTPError) as e:
             logger.error(f"Ошибка при запросе к Prometheus: {e}")
             return None
+        except parse_errors as e:
+            logger.error(f"Ошибка при разборе ответа Prometheus: {e}")
+            return None
 
-    def get_plant_humidity(self, metric: str = "tuya_plant_humidity") -> List[Dict]:
+    def get_plant_columns(self, metric: str = "tuya_plant_humidity") -> Optional[PlantColumns]:
         """
-        Получить данные о влажности растений с порогами
+        Получить данные о влажности растений с порогами в колоночном виде
 
         Args:
             metric: Название метрики (по умолчанию: tuya_plant_humidity)
 
         Returns:
-            Список словарей с данными о растениях:
-            [
-                {
-                    'device_id': 'bf309cd05e5f50b8e1ef1e',
-                    'device_name': 'Алла',
-                    'humidity': 54,
-                    'threshold_min': 30,
-                    'threshold_max': 80,
-                    'is_online': True
-                },
-                ...
-            ]
+            PlantColumns, отсортированные по имени, или None в случае ошибки
         """
         # Получаем данные влажности
-        humidity_data = self.query(metric)
+        humidity_data = self.query_series(metric)
 
-        if not humidity_data:
+        if humidity_data is None:
             logger.warning("Не удалось получить данные о влажности из Prometheus")
-            return []
+            return None
 
         # Получаем пороги min и max
-        threshold_min_data = self.query("tuya_plant_humidity_threshold_min")
-        threshold_max_data = self.query("tuya_plant_humidity_threshold_max")
+        threshold_min_data = self.query_series("tuya_plant_humidity_threshold_min", strict=True)
+        threshold_max_data = self.query_series("tuya_plant_humidity_threshold_max", strict=True)
 
         # Получаем timestamp последнего успешного обновления (общая метрика)
-        last_success_data = self.query("tuya_exporter_last_success_timestamp")
+        last_success_data = self.query_series("tuya_exporter_last_success_timestamp", typecode='d')
 
         # Создаем словари для быстрого поиска по device_id
-        thresholds_min = {}
-        thresholds_max = {}
-        last_success_timestamp = 0
-
-        if threshold_min_data:
-            for item in threshold_min_data.get('data', {}).get('result', []):
-                device_id = item.get('metric', {}).get('device_id')
-                value = item.get('value', [None, None])
-                if device_id and value[1]:
-                    thresholds_min[device_id] = int(float(value[1]))
-
-        if threshold_max_data:
-            for item in threshold_max_data.get('data', {}).get('result', []):
-                device_id = item.get('metric', {}).get('device_id')
-                value = item.get('value', [None, None])
-                if device_id and value[1]:
-                    thresholds_max[device_id] = int(float(value[1]))
-
-        # Получаем общий timestamp последнего успешного обновления
-        if last_success_data:
-            results = last_success_data.get('data', {}).get('result', [])
-            if results:
-                value = results[0].get('value', [None, None])
-                if value[1]:
-                    last_success_timestamp = float(value[1])
-
-        # Собираем данные о растениях
-        result = humidity_data.get('data', {}).get('result', [])
-        plants = []
-        current_time = time.time()
+        thresholds_min = threshold_min_data.as_dict() if threshold_min_data else {}
+        thresholds_max = threshold_max_data.as_dict() if threshold_max_data else {}
+        last_success_timestamp = last_success_data.values[0] if last_success_data else 0
 
         # Проверяем, онлайн ли экспортер (общая проверка для всех устройств)
+        current_time = time.time()
         time_since_update = current_time - last_success_timestamp if last_success_timestamp > 0 else 999999
-        is_online = time_since_update <= 120  # Онлайн если обновлялось менее 120 сек назад
-
-        for item in result:
-            try:
-                labels = item.get('metric', {})
-                value = item.get('value', [None, None])
-                device_id = labels.get('device_id', 'unknown')
-
-                plant = {
-                    'device_id': device_id,
-                    'device_name': labels.get('device_name', 'Unknown'),
-                    'humidity': int(float(value[1])) if value[1] else 0,
-                    'threshold_min': thresholds_min.get(device_id, 30),  # По умолчанию 30
-                    'threshold_max': thresholds_max.get(device_id, 80),  # По умолчанию 80
-                    'instance': labels.get('instance', ''),
-                    'job': labels.get('job', ''),
-                    'is_online': is_online,
-                    'last_success_timestamp': last_success_timestamp,
-                    'time_since_update': int(time_since_update)
-                }
-
-                plants.append(plant)
-                status = "online" if is_online else f"OFFLINE ({int(time_since_update)}s)"
+
+        # Сортируем по имени для предсказуемого порядка
+        plants = PlantColumns(
+            humidity_data.sorted_by_name(), thresholds_min, thresholds_max,
+            last_success_timestamp, time_since_update
+        )
+
+        if logger.isEnabledFor(logging.DEBUG):
+            status = "online" if plants.is_online else f"OFFLINE ({plants.time_since_update}s)"
+            for index in range(len(plants)):
                 logger.debug(
-                    f"Получены данные растения: {plant['device_name']} - {plant['humidity']}% "
-                    f"(min: {plant['threshold_min']}, max: {plant['threshold_max']}) [{status}]"
+                    f"Получены данные растения: {plants.device_names[index]} - {plants.humidity[index]}% "
+                    f"(min: {plants.thresholds_min[index]}, max: {plants.thresholds_max[index]}) [{status}]"
                 )
 
-            except (ValueError, IndexError, KeyError) as e:
-                logger.error(f"Ошибка при парсинге данных растения: {e}")
-                continue
-
         logger.info(f"Получено данных о {len(plants)} растениях")
-        plants.sort(key=lambda p: p['device_name'])  # Сортируем по имени для предсказуемого порядка
         return plants
 
+    def get_plant_humidity(self, metric: str = "tuya_plant_humidity") -> List[Dict]:
+        """
+        Получить данные о влажности растений с порогами
+
+        Args:
+            metric: Название метрики (по умолчанию: tuya_plant_humidity)
+
+        Returns:
+            Список словарей с данными о растениях, отсортированный по имени:
+            [
+                {
+                    'device_id': 'bf309cd05e5f50b8e1ef1e',
+                    'device_name': 'Алла',
+                    'humidity': 54,
+                    'threshold_min': 30,
+                    'threshold_max': 80,
+                    'is_online': True
+                },
+                ...
+            ]
+        """
+        plants = self.get_plant_columns(metric)
+        if plants is None:
+            return []
+        return [plants.plant(index) for index in range(len(plants))]
+
 
 if __name__ == "__main__":
     # Тестирование модуля
@@ -0,0 +1,96 @@
+"""
+Модуль для профилирования холодного старта: время импортов и фаз инициализации
+"""
+
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Iterator, List, Tuple
+
+
+class StartupProfiler:
+    """Сборщик длительностей отложенных импортов и фаз запуска"""
+
+    def __init__(self):
+        """Инициализация профайлера (точка отсчета - момент создания)"""
+        self.started_at = time.perf_counter()
+        self.imports: List[Tuple[str, float, str]] = []  # (модуль, длительность, поток)
+        self.phases: List[Tuple[str, float, float]] = []  # (фаза, смещение от старта, длительность)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Замерить длительность фазы инициализации
+
+        Args:
+            name: Название фазы (например: "загрузка конфигурации")
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                self.phases.append((name, start - self.started_at, duration))
+
+    def import_module(self, name: str) -> ModuleType:
+        """
+        Импортировать модуль, записав время импорта, если он еще не загружен
+
+        Args:
+            name: Полное имя модуля (например: PIL.Image)
+
+        Returns:
+            Загруженный модуль
+        """
+        if name in sys.modules:
+            return importlib.import_module(name)
+
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        duration = time.perf_counter() - start
+        with self._lock:
+            self.imports.append((name, duration, threading.current_thread().name))
+        return module
+
+    def format_report(self) -> str:
+        """
+        Сформировать текстовый отчет по импортам и фазам
+
+        Returns:
+            Многострочная строка с отчетом
+        """
+        with self._lock:
+            imports = sorted(self.imports, key=lambda item: item[1], reverse=True)
+            phases = sorted(self.phases, key=lambda item: item[1])
+
+        total = time.perf_counter() - self.started_at
+        lines = ["Профиль запуска:", "  Импорты (отложенные, по убыванию):"]
+        for name, duration, thread_name in imports:
+            lines.append(f"    {duration * 1000:8.1f} мс  {name} [{thread_name}]")
+        lines.append("  Фазы инициализации (старт +смещение, длительность):")
+        for name, offset, duration in phases:
+            lines.append(f"    +{offset * 1000:8.1f} мс  {duration * 1000:8.1f} мс  {name}")
+        lines.append(f"  Всего с момента запуска: {total * 1000:.1f} мс")
+        return "\n".join(lines)
+
+
+# Общий профайлер процесса: модули регистрируют в нем свои отложенные импорты
+profiler = StartupProfiler()
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Импортировать тяжелый модуль при первом использовании
+
+    Args:
+        name: Полное имя модуля
+
+    Returns:
+        Загруженный модуль
+    """
+    return profiler.import_module(name)